@@ -26,18 +26,40 @@ class Config:
     # ==================== Webhook 配置 ====================
     WEBHOOK_URL: str = os.getenv('WEBHOOK_URL', '')
     WEBHOOK_SEND_INTERVAL: float = float(os.getenv('WEBHOOK_SEND_INTERVAL', '3.0'))
+    # 限流、网络等可恢复错误的重试退避上限（秒），约为平台限流窗口
+    WEBHOOK_RETRY_MAX_DELAY: float = float(os.getenv('WEBHOOK_RETRY_MAX_DELAY', '60'))
     
     # ==================== 运行时配置 ====================
     TIMEZONE = pytz.timezone('Asia/Shanghai')
     WORK_START_HOUR: int = int(os.getenv('WORK_START_HOUR', '0'))
     WORK_END_HOUR: int = int(os.getenv('WORK_END_HOUR', '24'))
     
+    # ==================== 优先级与过载保护 ====================
+    # 命中以下任一规则的消息为高优先级，始终优先发送且不会被丢弃
+    PRIORITY_KEYWORDS: list[str] = [
+        k.strip() for k in os.getenv('PRIORITY_KEYWORDS', '').split(',') if k.strip()
+    ]
+    PRIORITY_ADMIN_IDS: set[int] = {
+        int(i) for i in os.getenv('PRIORITY_ADMIN_IDS', '').split(',') if i.strip()
+    }
+    PRIORITY_GROUP_ADMINS: bool = os.getenv('PRIORITY_GROUP_ADMINS', 'true').lower() == 'true'
+    PRIORITY_MENTIONS: bool = os.getenv('PRIORITY_MENTIONS', 'true').lower() == 'true'
+    PRIORITY_PINNED_REPLIES: bool = os.getenv('PRIORITY_PINNED_REPLIES', 'true').lower() == 'true'
+    # 置顶消息列表的兜底刷新间隔（秒），置顶变化事件会立即触发刷新
+    PINNED_REFRESH_INTERVAL: int = int(os.getenv('PINNED_REFRESH_INTERVAL', '60'))
+    # 队列积压超过阈值时丢弃对应优先级的新消息（0 表示不丢弃）
+    BACKLOG_SHED_LOW: int = int(os.getenv('BACKLOG_SHED_LOW', '30'))
+    BACKLOG_SHED_NORMAL: int = int(os.getenv('BACKLOG_SHED_NORMAL', '100'))
+    # 丢弃统计汇总的发送间隔（秒）
+    SHED_SUMMARY_INTERVAL: int = int(os.getenv('SHED_SUMMARY_INTERVAL', '300'))
+    
     # ==================== 日志配置 ====================
     LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE: str = os.getenv('LOG_FILE', 'logs/telegram_monitor.log')
     
     # ==================== 文件路径 ====================
     LAST_ID_FILE: Path = Path('last_id.txt')
+    FAILED_ID_FILE: Path = Path('failed_ids.txt')
     
     @classmethod
     def validate(cls) -> tuple[bool, Optional[str]]:
@@ -77,6 +99,10 @@ class Config:
         print(f"WEBHOOK_URL: {cls.WEBHOOK_URL[:50]}..." if len(cls.WEBHOOK_URL) > 50 else f"WEBHOOK_URL: {cls.WEBHOOK_URL}")
         print(f"工作时段: {cls.WORK_START_HOUR:02d}:00 - {cls.WORK_END_HOUR:02d}:00")
         print(f"Webhook 间隔: {cls.WEBHOOK_SEND_INTERVAL} 秒")
+        print(f"Webhook 重试退避上限: {cls.WEBHOOK_RETRY_MAX_DELAY} 秒")
+        print(f"优先关键词: {', '.join(cls.PRIORITY_KEYWORDS) if cls.PRIORITY_KEYWORDS else '未配置'}")
+        print(f"积压丢弃阈值: 低 {cls.BACKLOG_SHED_LOW} 条 / 普通 {cls.BACKLOG_SHED_NORMAL} 条")
+        print(f"丢弃汇总间隔: {cls.SHED_SUMMARY_INTERVAL} 秒")
         print(f"日志级别: {cls.LOG_LEVEL}")
         print(f"日志文件: {cls.LOG_FILE}")
         print("=" * 60 + "\n")
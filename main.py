@@ -10,18 +10,23 @@ Telegram 私密群组消息转发器 - 服务器长连接版
 5. 转发至钉钉/飞书/企业微信 Webhook（自动识别）
 6. 完善的日志系统和异常处理
 7. 支持工作时段配置
+8. 按优先级排队转发，积压过多时丢弃低优先级消息并周期汇总
 """
 
 import asyncio
+import itertools
+import json
+import re
 import signal
 import sys
+from collections import Counter
 from datetime import datetime
 from typing import Optional
 
 import aiohttp
 from telethon import TelegramClient, events
 from telethon.sessions import StringSession
-from telethon.tl.types import Message
+from telethon.tl.types import ChannelParticipantsAdmins, InputMessagesFilterPinned, Message
 
 from config import Config
 from logger import logger
@@ -30,6 +35,18 @@ from logger import logger
 # ==================== 全局变量 ====================
 client: Optional[TelegramClient] = None
 running = True
+# 分片消息已确认的分片数，用于重试时跳过已发送的分片
+acked_parts: dict[int, int] = {}
+
+# 优先级（数值越小越优先）
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_NAMES = {PRIORITY_HIGH: '高', PRIORITY_NORMAL: '普通', PRIORITY_LOW: '低'}
+
+# 高优先级规则所需的群组状态
+admin_ids: set[int] = set(Config.PRIORITY_ADMIN_IDS)
+pinned_ids: set[int] = set()
 
 
 # ==================== 工具函数 ====================
@@ -82,7 +99,295 @@ def save_last_message_id(message_id: int) -> None:
         logger.error(f"保存 last_id.txt 失败: {e}")
 
 
+def save_failed_message_id(message_id: int) -> None:
+    """
+    追加记录转发失败并已放弃的消息 ID
+    
+    Args:
+        message_id: 消息 ID
+    """
+    try:
+        with Config.FAILED_ID_FILE.open('a') as f:
+            f.write(f"{message_id}\n")
+    except IOError as e:
+        logger.error(f"保存 {Config.FAILED_ID_FILE} 失败: {e}")
+
+
+def format_sender_name(sender) -> str:
+    """
+    获取发送者的显示名称
+    
+    Args:
+        sender: Telegram 用户或频道对象
+        
+    Returns:
+        str: 发送者名称，无法识别时返回 "未知用户"
+    """
+    if sender:
+        if hasattr(sender, 'first_name') and sender.first_name:
+            sender_name = sender.first_name
+            if hasattr(sender, 'last_name') and sender.last_name:
+                sender_name += f" {sender.last_name}"
+            return sender_name
+        elif hasattr(sender, 'title') and sender.title:
+            return sender.title
+    return "未知用户"
+
+
+# ==================== 消息分片 ====================
+# 切分边界，按优先顺序：段落、行、句子（分隔符保留在前一段末尾）
+SPLIT_PATTERNS = [
+    re.compile(r'(?<=\n\n)'),
+    re.compile(r'(?<=\n)'),
+    re.compile(r'(?<=[。！？；])|(?<=[.!?;] )'),
+]
+CODE_FENCE = '```'
+# 成对出现的双字符行内强调标记（加粗、斜体、删除线）
+DOUBLE_DELIMITERS = ('**', '__', '~~')
+# 行内标记被强行切断时闭合并重新打开所需的字节数
+INLINE_RESERVE = 16
+# 段落分隔（空行）与单个 * 斜体标记（不属于 **）
+BLANK_LINE_PATTERN = re.compile(r'\n[ \t]*\n')
+SINGLE_STAR_PATTERN = re.compile(r'(?<!\*)\*(?!\*)')
+
+
+def json_byte_size(text: str) -> int:
+    """
+    计算文本作为 JSON 字符串值发送时的 UTF-8 字节数（不含两侧引号）
+    
+    Args:
+        text: 文本
+        
+    Returns:
+        int: 字节数
+    """
+    return len(json.dumps(text, ensure_ascii=False).encode('utf-8')) - 2
+
+
+def _scan_markdown(text: str, cuts: frozenset = frozenset()) -> tuple[list[bool], dict]:
+    """
+    扫描文本中的 markdown 结构
+    
+    行内结构（加粗、斜体、删除线、行内代码、链接）不跨段落，
+    链接不跨行；代码块内部不识别行内结构。只有在段落（链接为行）
+    结束前存在对应闭合标记时才视为打开，否则按普通字符处理，
+    避免 2*3、it`s、my_var__name 之类的孤立标记影响后续切分。
+    
+    Args:
+        text: 文本
+        cuts: 需要记录结构状态的切分位置
+        
+    Returns:
+        (safe, states):
+            safe[i] 表示在第 i 个字符前切分不会截断行内结构；
+            states[c] 为切分位置 c 处的 (fence, delimiters)：fence 为未闭合
+            代码块的起始行（如 "```python"），否则为 None；delimiters 为
+            未闭合的行内标记，按打开顺序排列
+    """
+    n = len(text)
+    safe = [True] * (n + 1)
+    fence = None
+    stack: list[str] = []
+    states: dict[int, tuple[Optional[str], list[str]]] = {}
+    link = 0  # 0: 不在链接中，1: 在 [...] 中，2: 在 (...) 中
+    line_end, para_end = 0, -1
+    i = 0
+    
+    while i < n:
+        if i == 0 or text[i - 1] == '\n':
+            line_end = text.find('\n', i)
+            if line_end == -1:
+                line_end = n
+            if i > para_end:
+                blank = BLANK_LINE_PATTERN.search(text, i)
+                para_end = blank.start() if blank else n
+            line = text[i:line_end].strip()
+            
+            if line.startswith(CODE_FENCE):
+                fence = None if fence is not None else line
+                stack.clear()
+                link = 0
+                for j in range(i + 1, line_end):
+                    safe[j] = False
+                i = line_end
+                if i in cuts:
+                    states[i] = (fence, [])
+                continue
+            
+            if not line:
+                stack.clear()
+                link = 0
+        
+        step = 1
+        if fence is None:
+            ch = text[i]
+            if stack and stack[-1] == '`':
+                if ch == '`':
+                    stack.pop()
+            elif ch == '`':
+                if text.find('`', i + 1, para_end) != -1:
+                    stack.append('`')
+            elif text.startswith(DOUBLE_DELIMITERS, i):
+                delimiter = text[i:i + 2]
+                if delimiter in stack:
+                    while stack.pop() != delimiter:
+                        pass
+                elif text.find(delimiter, i + 2, para_end) != -1:
+                    stack.append(delimiter)
+                step = 2
+            elif ch == '*' and '*' in stack:
+                while stack.pop() != '*':
+                    pass
+            elif ch == '*':
+                if (i + 1 < n and not text[i + 1].isspace()
+                        and SINGLE_STAR_PATTERN.search(text, i + 1, para_end)):
+                    stack.append('*')
+            elif ch == '\n':
+                link = 0
+            elif ch == '[' and not link:
+                close = text.find('](', i, line_end)
+                if close != -1 and text.find(')', close + 2, line_end) != -1:
+                    link = 1
+            elif ch == ']' and link == 1:
+                if text.startswith('](', i):
+                    link = 2
+                    step = 2
+                else:
+                    link = 0
+            elif ch == ')' and link == 2:
+                link = 0
+        
+        for j in range(i + 1, i + step):
+            safe[j] = False
+        i += step
+        safe[i] = fence is not None or (not stack and not link)
+        if i in cuts:
+            states[i] = (fence, list(stack))
+    
+    return safe, states
+
+
+def _split_range(text: str, safe: list[bool], start: int, end: int, budget: int, level: int) -> list[tuple[int, int]]:
+    """
+    按第 level 级边界切分 text[start:end]
+    
+    只在不截断行内结构的位置切分；所有边界都用尽后按字符切分，
+    单个行内结构本身超长时才强行切断，由 _balance_markdown 补全标记。
+    """
+    if level < len(SPLIT_PATTERNS):
+        cuts = [m.start() for m in SPLIT_PATTERNS[level].finditer(text, start, end)]
+        bounds = [start] + [c for c in cuts if start < c < end and safe[c]] + [end]
+    elif level == len(SPLIT_PATTERNS):
+        bounds = [start] + [c for c in range(start + 1, end) if safe[c]] + [end]
+    else:
+        bounds = [start] + [
+            c for c in range(start + 1, end) if text[c - 1:c + 1] not in DOUBLE_DELIMITERS
+        ] + [end]
+    return _pack_ranges(text, safe, bounds, budget, level)
+
+
+def _pack_ranges(text: str, safe: list[bool], bounds: list[int], budget: int, level: int) -> list[tuple[int, int]]:
+    """将相邻边界之间的片段依次装入不超过预算的分片，超长片段按下一级边界继续切分"""
+    ranges = []
+    chunk_start = chunk_end = bounds[0]
+    size = 0
+    
+    for piece_start, piece_end in zip(bounds, bounds[1:]):
+        piece_size = json_byte_size(text[piece_start:piece_end])
+        
+        if piece_size > budget:
+            if chunk_end > chunk_start:
+                ranges.append((chunk_start, chunk_end))
+            ranges.extend(_split_range(text, safe, piece_start, piece_end, budget, level + 1))
+            chunk_start = chunk_end = piece_end
+            size = 0
+            continue
+        
+        if size + piece_size > budget:
+            ranges.append((chunk_start, chunk_end))
+            chunk_start = piece_start
+            size = 0
+        
+        chunk_end = piece_end
+        size += piece_size
+    
+    if chunk_end > chunk_start:
+        ranges.append((chunk_start, chunk_end))
+    return ranges
+
+
+def _balance_markdown(text: str, ranges: list[tuple[int, int]]) -> list[str]:
+    """代码块或行内标记被切断时，在分片末尾闭合并在下一分片开头重新打开"""
+    cuts = frozenset(start for start, _ in ranges) | frozenset(end for _, end in ranges)
+    _, states = _scan_markdown(text, cuts)
+    balanced = []
+    
+    for start, end in ranges:
+        chunk = text[start:end].strip('\n')
+        if not chunk:
+            continue
+        
+        fence, delimiters = states.get(start, (None, []))
+        if fence is not None:
+            chunk = fence + '\n' + chunk
+        elif delimiters:
+            chunk = ''.join(delimiters) + chunk
+        
+        fence, delimiters = states.get(end, (None, []))
+        if fence is not None:
+            chunk += '\n' + CODE_FENCE
+        elif delimiters:
+            chunk += ''.join(reversed(delimiters))
+        
+        balanced.append(chunk)
+    return balanced
+
+
+def split_message_text(text: str, budget: int) -> list[str]:
+    """
+    按字节预算切分消息正文
+    
+    依次尝试在段落、行、句子边界切分，每个片段只计算一次字节数，
+    仅对仍然超长的片段继续细分；不在加粗、行内代码、链接等结构内部切分，
+    被切断的代码块会在分片间补全（保留语言标记）。
+    
+    Args:
+        text: 消息正文
+        budget: 每个分片正文可用的字节数（按 JSON 转义后的 UTF-8 计算）
+        
+    Returns:
+        list[str]: 分片列表，未超长时只有一个元素
+    """
+    if json_byte_size(text) <= budget:
+        return [text]
+    
+    # 预留补全标记所需的字节："\n```" 与 "```lang\n"，或行内标记
+    fence_lines = [line.strip() for line in text.split('\n') if line.strip().startswith(CODE_FENCE)]
+    reserve = max([INLINE_RESERVE] + [json_byte_size(f"\n{CODE_FENCE}{line}\n") for line in fence_lines])
+    budget = max(budget - reserve, 64)
+    
+    safe, _ = _scan_markdown(text)
+    ranges = _split_range(text, safe, 0, len(text), budget, 0)
+    return _balance_markdown(text, ranges)
+
+
 # ==================== Webhook 转发 ====================
+# 各平台单条消息的字节上限：企微 markdown 内容 4096 字节，钉钉/飞书请求体约 20KB
+WEBHOOK_BYTE_LIMITS = {
+    'dingtalk': 20000,
+    'feishu': 20000,
+    'wecom': 4096,
+}
+# 预留的最宽分片编号，用于计算正文可用字节数
+PART_LABEL_RESERVE = " (99/99)"
+# 发送结果：成功 / 可重试（限流、服务端或网络错误）/ 平台拒收，重试无意义
+SEND_OK = 'ok'
+SEND_RETRY = 'retry'
+SEND_FAILED = 'failed'
+# 可重试的错误码：系统繁忙(-1)、钉钉限流(130101)、企微限流(45009)、飞书限流(11232)
+RETRYABLE_ERRCODES = {-1, 130101, 45009, 11232}
+
+
 def detect_webhook_type(url: str) -> str:
     """
     根据 Webhook URL 自动检测平台类型
@@ -104,50 +409,51 @@ def detect_webhook_type(url: str) -> str:
         return 'dingtalk'
 
 
-async def send_to_webhook(sender_name: str, send_time: str, message_text: str, message_id: int) -> bool:
+def build_payload(webhook_type: str, sender_name: str, send_time: str, message_text: str,
+                  message_id: Optional[int], part_label: str = "") -> dict:
     """
-    将消息转发至钉钉/飞书/企业微信 Webhook（异步版本）
-    自动根据 URL 识别平台类型
+    构建对应平台的消息格式
     
     Args:
+        webhook_type: 'dingtalk', 'feishu', 'wecom' 之一
         sender_name: 发送者名称
         send_time: 发送时间
-        message_text: 消息正文
-        message_id: 消息 ID
+        message_text: 消息正文（或其中一个分片）
+        message_id: 消息 ID，为 None 时不显示（如系统汇总消息）
+        part_label: 分片编号，如 " (1/3)"，不分片时为空
         
     Returns:
-        bool: 发送成功返回 True，否则返回 False
+        dict: 请求体
     """
-    # 检测 Webhook 类型
-    webhook_type = detect_webhook_type(Config.WEBHOOK_URL)
+    has_id = message_id is not None
+    title = f"🔔 舒芙蕾Push{part_label}"
     
-    # 根据不同平台构建消息格式
     if webhook_type == 'dingtalk':
         # 钉钉机器人 - Markdown 格式
-        payload = {
+        return {
             "msgtype": "markdown",
             "markdown": {
-                "title": "🔔 舒芙蕾Push",
-                "text": f"### 🔔 舒芙蕾Push\n\n"
+                "title": title,
+                "text": f"### {title}\n\n"
                         f"**发送者：** {sender_name}\n\n"
                         f"**时间：** {send_time}\n\n"
-                        f"**消息ID：** {message_id}\n\n"
+                        + (f"**消息ID：** {message_id}\n\n" if has_id else "") +
                         f"**内容：**\n\n{message_text}"
             }
         }
         
     elif webhook_type == 'feishu':
         # 飞书机器人 - Post 格式
-        payload = {
+        return {
             "msg_type": "post",
             "content": {
                 "post": {
                     "zh_CN": {
-                        "title": "🔔 舒芙蕾Push",
+                        "title": title,
                         "content": [
                             [{"tag": "text", "text": f"【发送者】{sender_name}\n"}],
                             [{"tag": "text", "text": f"【时间】{send_time}\n"}],
-                            [{"tag": "text", "text": f"【消息ID】{message_id}\n"}],
+                        ] + ([[{"tag": "text", "text": f"【消息ID】{message_id}\n"}]] if has_id else []) + [
                             [{"tag": "text", "text": f"【内容】\n{message_text}"}]
                         ]
                     }
@@ -157,63 +463,150 @@ async def send_to_webhook(sender_name: str, send_time: str, message_text: str, m
         
     else:  # wecom
         # 企业微信机器人 - Markdown 格式
-        payload = {
+        return {
             "msgtype": "markdown",
             "markdown": {
-                "content": f"### 🔔 舒芙蕾Push\n"
+                "content": f"### {title}\n"
                           f"**发送者：** {sender_name}\n"
                           f"**时间：** {send_time}\n"
-                          f"**消息ID：** {message_id}\n"
+                          + (f"**消息ID：** {message_id}\n" if has_id else "") +
                           f"**内容：**\n{message_text}"
             }
         }
+
+
+def response_errcode(response_text: str) -> int:
+    """
+    解析 Webhook 响应中的错误码
     
+    三个平台出错时都可能返回 HTTP 200，需要检查响应体中的错误码
+    （钉钉/企微为 errcode，飞书为 code / StatusCode）。
+    
+    Args:
+        response_text: 响应体
+        
+    Returns:
+        int: 错误码，成功或无法解析时返回 0
+    """
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                Config.WEBHOOK_URL,
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                response_text = await response.text()
-                
-                if response.status == 200:
-                    logger.info(f"消息 {message_id} 已转发至 {webhook_type.upper()} Webhook")
-                    return True
-                else:
-                    logger.warning(f"Webhook 返回错误状态码: {response.status}, 响应: {response_text}")
-                    return False
+        result = json.loads(response_text)
+    except ValueError:
+        return 0
+    
+    if not isinstance(result, dict):
+        return 0
+    return result.get('errcode', result.get('code', result.get('StatusCode', 0)))
+
+
+async def post_payload(session: aiohttp.ClientSession, payload: dict, webhook_type: str, desc: str) -> str:
+    """
+    发送单个请求体至 Webhook
+    
+    Args:
+        session: aiohttp 会话
+        payload: 请求体
+        webhook_type: 平台类型
+        desc: 日志中的消息描述
+        
+    Returns:
+        str: SEND_OK / SEND_RETRY（限流、服务端或网络错误）/ SEND_FAILED（平台拒收）
+    """
+    try:
+        async with session.post(
+            Config.WEBHOOK_URL,
+            data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+            headers={'Content-Type': 'application/json; charset=utf-8'},
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            response_text = await response.text()
+            
+            if response.status != 200:
+                logger.warning(f"Webhook 返回错误状态码: {response.status}, 响应: {response_text}")
+                return SEND_RETRY if response.status == 429 or response.status >= 500 else SEND_FAILED
+            
+            errcode = response_errcode(response_text)
+            if errcode == 0:
+                logger.info(f"消息 {desc} 已转发至 {webhook_type.upper()} Webhook")
+                return SEND_OK
+            
+            logger.warning(f"Webhook 返回错误码: {errcode}, 响应: {response_text}")
+            return SEND_RETRY if errcode in RETRYABLE_ERRCODES else SEND_FAILED
             
     except Exception as e:
         logger.error(f"发送至 Webhook 失败: {e}")
-        return False
+        return SEND_RETRY
+
+
+async def send_to_webhook(sender_name: str, send_time: str, message_text: str, message_id: Optional[int]) -> str:
+    """
+    将消息转发至钉钉/飞书/企业微信 Webhook（异步版本）
+    自动根据 URL 识别平台类型
+    
+    超出平台长度限制的消息会被拆分为多条带编号的分片，
+    作为一个整体按顺序发送，任一分片失败即停止。已确认的分片
+    记录在 acked_parts 中，重试时从第一个未确认的分片继续。
+    
+    Args:
+        sender_name: 发送者名称
+        send_time: 发送时间
+        message_text: 消息正文
+        message_id: 消息 ID，为 None 时不显示（如系统汇总消息）
+        
+    Returns:
+        str: 全部分片发送成功返回 SEND_OK，否则返回失败分片的 SEND_RETRY / SEND_FAILED
+    """
+    # 检测 Webhook 类型
+    webhook_type = detect_webhook_type(Config.WEBHOOK_URL)
+    desc = str(message_id) if message_id is not None else "(汇总)"
+    
+    # 按平台字节上限拆分正文
+    header = build_payload(webhook_type, sender_name, send_time, "", message_id, PART_LABEL_RESERVE)
+    budget = WEBHOOK_BYTE_LIMITS[webhook_type] - len(json.dumps(header, ensure_ascii=False).encode('utf-8'))
+    parts = split_message_text(message_text, budget)
+    acked = acked_parts.get(message_id, 0) if message_id is not None else 0
+    
+    if acked:
+        logger.info(f"消息 {desc} 从第 {acked + 1}/{len(parts)} 条分片继续发送")
+    elif len(parts) > 1:
+        logger.info(f"消息 {desc} 超出 {webhook_type.upper()} 长度限制，拆分为 {len(parts)} 条发送")
+    
+    async with aiohttp.ClientSession() as session:
+        for i, part in enumerate(parts[acked:], acked + 1):
+            part_label = f" ({i}/{len(parts)})" if len(parts) > 1 else ""
+            if i > acked + 1:
+                await asyncio.sleep(Config.WEBHOOK_SEND_INTERVAL)
+            
+            payload = build_payload(webhook_type, sender_name, send_time, part, message_id, part_label)
+            status = await post_payload(session, payload, webhook_type, f"{desc}{part_label}")
+            if status != SEND_OK:
+                return status
+            if message_id is not None:
+                acked_parts[message_id] = i
+    
+    acked_parts.pop(message_id, None)
+    return SEND_OK
 
 
 # ==================== 消息处理 ====================
-async def process_message(message: Message) -> None:
+async def process_message(message: Message) -> str:
     """
     处理单条消息并转发
     
     Args:
         message: Telegram 消息对象
+        
+    Returns:
+        str: 已转发或按规则跳过返回 SEND_OK，否则返回 SEND_RETRY / SEND_FAILED
     """
     try:
         # 检查工作时段
         if not check_work_hours():
             logger.debug(f"消息 {message.id} 不在工作时段，跳过")
-            return
+            return SEND_OK
         
         # 获取发送者信息
         sender = await message.get_sender()
-        sender_name = "未知用户"
-        
-        if sender:
-            if hasattr(sender, 'first_name') and sender.first_name:
-                sender_name = sender.first_name
-                if hasattr(sender, 'last_name') and sender.last_name:
-                    sender_name += f" {sender.last_name}"
-            elif hasattr(sender, 'title') and sender.title:
-                sender_name = sender.title
+        sender_name = format_sender_name(sender)
         
         # 获取消息时间（转换为北京时间）
         send_time = message.date.astimezone(Config.TIMEZONE).strftime('%Y-%m-%d %H:%M:%S')
@@ -226,28 +619,277 @@ async def process_message(message: Message) -> None:
         logger.debug(f"消息内容: {message_text[:100]}{'...' if len(message_text) > 100 else ''}")
         
         # 转发至 Webhook
-        await send_to_webhook(sender_name, send_time, message_text, message.id)
-        
-        # 保存消息 ID
-        save_last_message_id(message.id)
+        status = await send_to_webhook(sender_name, send_time, message_text, message.id)
         
         # 频率限制
         await asyncio.sleep(Config.WEBHOOK_SEND_INTERVAL)
+        return status
         
     except Exception as e:
         logger.error(f"处理消息 {message.id} 时发生错误: {e}", exc_info=True)
+        return SEND_RETRY
 
 
-async def fetch_history_messages(client: TelegramClient, last_id: int) -> int:
+# ==================== 优先级与过载保护 ====================
+def classify_message(message: Message) -> int:
     """
-    获取并处理历史消息（从上次记录到现在）
+    根据配置的规则判断消息优先级
+    
+    高优先级：@提及当前账号、管理员发送、回复置顶消息、命中关键词
+    低优先级：非文本消息
+    其余为普通优先级
     
     Args:
-        client: Telegram 客户端实例
-        last_id: 上次处理的消息 ID
+        message: Telegram 消息对象
         
     Returns:
-        int: 最新处理的消息 ID
+        int: PRIORITY_HIGH / PRIORITY_NORMAL / PRIORITY_LOW 之一
+    """
+    if Config.PRIORITY_MENTIONS and message.mentioned:
+        return PRIORITY_HIGH
+    
+    if message.sender_id in admin_ids:
+        return PRIORITY_HIGH
+    
+    if Config.PRIORITY_PINNED_REPLIES and message.reply_to_msg_id in pinned_ids:
+        return PRIORITY_HIGH
+    
+    if not message.text:
+        return PRIORITY_LOW
+    
+    text = message.text.lower()
+    if any(keyword.lower() in text for keyword in Config.PRIORITY_KEYWORDS):
+        return PRIORITY_HIGH
+    
+    return PRIORITY_NORMAL
+
+
+async def load_admin_ids(client: TelegramClient) -> None:
+    """
+    加载群管理员 ID，用于高优先级判断
+    
+    Args:
+        client: Telegram 客户端实例
+    """
+    if not Config.PRIORITY_GROUP_ADMINS:
+        return
+    
+    try:
+        admins = await client.get_participants(Config.TG_CHAT_ID, filter=ChannelParticipantsAdmins)
+        admin_ids.update(admin.id for admin in admins)
+        logger.info(f"已加载 {len(admins)} 名群管理员")
+    except Exception as e:
+        logger.warning(f"获取群管理员失败: {e}")
+
+
+async def refresh_pinned_ids(client: TelegramClient) -> None:
+    """
+    刷新群组置顶消息 ID，用于高优先级判断
+    
+    Args:
+        client: Telegram 客户端实例
+    """
+    if not Config.PRIORITY_PINNED_REPLIES:
+        return
+    
+    try:
+        messages = await client.get_messages(
+            Config.TG_CHAT_ID,
+            filter=InputMessagesFilterPinned,
+            limit=100
+        )
+        pinned_ids.clear()
+        pinned_ids.update(msg.id for msg in messages)
+        logger.debug(f"已刷新置顶消息: {len(pinned_ids)} 条")
+    except Exception as e:
+        logger.warning(f"获取置顶消息失败: {e}")
+
+
+async def pinned_refresh_loop(client: TelegramClient) -> None:
+    """
+    周期性刷新置顶消息，作为置顶事件丢失时的兜底
+    
+    Args:
+        client: Telegram 客户端实例
+    """
+    while True:
+        await asyncio.sleep(Config.PINNED_REFRESH_INTERVAL)
+        await refresh_pinned_ids(client)
+
+
+class MessageDispatcher:
+    """
+    消息转发调度器
+    
+    所有待转发消息按优先级进入队列，由单个工作协程依次发送，
+    同一优先级内保持消息顺序。实时消息积压超过阈值时，新到的低优先级
+    消息被直接丢弃并计数，高优先级消息和历史补发消息永不丢弃。
+    丢弃汇总同样作为高优先级任务进入队列，受发送间隔限制。
+    
+    消息按优先级乱序发送，因此 last_id 只推进到"之前的消息全部
+    处理完毕"的位置，保证重启补发时不会遗漏。限流、网络等可恢复错误
+    按指数退避暂停发送后重试，期间消息保持未完成状态；只有平台拒收的
+    消息记入 FAILED_ID_FILE 后视为已处理，不会阻塞 last_id。
+    """
+    
+    def __init__(self, last_id: int):
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self.pending_ids: set[int] = set()
+        self.done_id = last_id
+        self.saved_id = last_id
+        self.shed_counts: Counter = Counter()
+        self.shed_senders: Counter = Counter()
+        self.attempts: Counter = Counter()
+        self.history_backlog = 0
+        self.summary_queued = False
+    
+    def _shed_threshold(self, priority: int) -> int:
+        if priority == PRIORITY_LOW:
+            return Config.BACKLOG_SHED_LOW
+        if priority == PRIORITY_NORMAL:
+            return Config.BACKLOG_SHED_NORMAL
+        return 0
+    
+    def submit(self, message: Message, from_history: bool = False) -> None:
+        """
+        将消息加入转发队列，实时消息积压过多时丢弃低优先级消息
+        
+        Args:
+            message: Telegram 消息对象
+            from_history: 是否为历史补发消息（不参与丢弃，也不计入积压）
+        """
+        if message.id <= self.saved_id or message.id in self.pending_ids:
+            return
+        
+        priority = classify_message(message)
+        backlog = self.queue.qsize() - self.history_backlog
+        threshold = self._shed_threshold(priority)
+        
+        if not from_history and threshold and backlog >= threshold:
+            self.shed_counts[priority] += 1
+            self.shed_senders[format_sender_name(message.sender) if message.sender else str(message.sender_id)] += 1
+            logger.info(f"积压 {backlog} 条，丢弃{PRIORITY_NAMES[priority]}优先级消息 ID: {message.id}")
+            self._complete(message.id)
+            return
+        
+        self.pending_ids.add(message.id)
+        self._enqueue(priority, next(self._seq), message, from_history)
+        logger.debug(f"消息 {message.id} 入队，优先级: {PRIORITY_NAMES[priority]}，当前积压: {backlog + 1}")
+    
+    def _enqueue(self, priority: int, seq: int, message: Optional[Message], from_history: bool) -> None:
+        """放入队列；message 为 None 表示丢弃汇总任务"""
+        if from_history:
+            self.history_backlog += 1
+        self.queue.put_nowait((priority, seq, message, from_history))
+    
+    def _complete(self, message_id: int) -> None:
+        """标记消息已处理，并推进可安全保存的 last_id"""
+        self.pending_ids.discard(message_id)
+        self.done_id = max(self.done_id, message_id)
+        
+        safe_id = self.done_id
+        if self.pending_ids:
+            safe_id = min(safe_id, min(self.pending_ids) - 1)
+        
+        if safe_id > self.saved_id:
+            save_last_message_id(safe_id)
+            self.saved_id = safe_id
+    
+    async def run(self) -> None:
+        """工作协程：按优先级依次转发队列中的消息"""
+        while True:
+            priority, seq, message, from_history = await self.queue.get()
+            if from_history:
+                self.history_backlog -= 1
+            
+            if message is None:
+                try:
+                    await self.send_shed_summary()
+                except Exception as e:
+                    logger.error(f"发送丢弃汇总失败: {e}", exc_info=True)
+                finally:
+                    self.summary_queued = False
+                    self.queue.task_done()
+                continue
+            
+            status = SEND_RETRY
+            try:
+                status = await process_message(message)
+            finally:
+                self.queue.task_done()
+            
+            if status == SEND_OK:
+                self.attempts.pop(message.id, None)
+                self._complete(message.id)
+                continue
+            
+            if status == SEND_FAILED:
+                self._dead_letter(message.id)
+                continue
+            
+            # 可恢复错误：暂停整个工作协程后重试，消息保持未完成状态
+            self.attempts[message.id] += 1
+            delay = min(Config.WEBHOOK_SEND_INTERVAL * 2 ** self.attempts[message.id], Config.WEBHOOK_RETRY_MAX_DELAY)
+            logger.warning(f"消息 {message.id} 转发失败，{delay:.0f} 秒后第 {self.attempts[message.id]} 次重试")
+            self._enqueue(priority, seq, message, from_history)
+            await asyncio.sleep(delay)
+    
+    def _dead_letter(self, message_id: int) -> None:
+        """放弃被平台拒收的消息：记入失败列表并视为已处理"""
+        self.attempts.pop(message_id, None)
+        acked_parts.pop(message_id, None)
+        logger.error(f"消息 {message_id} 被平台拒收，已放弃并记入 {Config.FAILED_ID_FILE}")
+        save_failed_message_id(message_id)
+        self._complete(message_id)
+    
+    async def send_shed_summary(self) -> None:
+        """发送丢弃统计汇总，发送成功后才扣减已汇报的计数"""
+        shed_counts = Counter(self.shed_counts)
+        shed_senders = Counter(self.shed_senders)
+        total = sum(shed_counts.values())
+        if not total:
+            return
+        
+        lines = [f"因消息积压，自上次汇总以来共丢弃 {total} 条消息："]
+        for priority in (PRIORITY_NORMAL, PRIORITY_LOW):
+            if shed_counts[priority]:
+                lines.append(f"- {PRIORITY_NAMES[priority]}优先级：{shed_counts[priority]} 条")
+        top_senders = "、".join(f"{name}({count})" for name, count in shed_senders.most_common(5))
+        lines.append(f"主要发送者：{top_senders}")
+        lines.append(f"当前积压：{self.queue.qsize()} 条")
+        
+        send_time = datetime.now(Config.TIMEZONE).strftime('%Y-%m-%d %H:%M:%S')
+        sent = await send_to_webhook("系统", send_time, "\n".join(lines), None) == SEND_OK
+        
+        # 频率限制
+        await asyncio.sleep(Config.WEBHOOK_SEND_INTERVAL)
+        
+        if sent:
+            self.shed_counts -= shed_counts
+            self.shed_senders -= shed_senders
+        else:
+            logger.warning("丢弃汇总发送失败，计数保留至下次汇总")
+    
+    async def report_loop(self) -> None:
+        """周期性将丢弃汇总作为高优先级任务加入队列"""
+        while True:
+            await asyncio.sleep(Config.SHED_SUMMARY_INTERVAL)
+            if self.shed_counts and not self.summary_queued:
+                self.summary_queued = True
+                self._enqueue(PRIORITY_HIGH, next(self._seq), None, False)
+
+
+async def fetch_history_messages(client: TelegramClient, last_id: int, dispatcher: MessageDispatcher) -> None:
+    """
+    获取历史消息（从上次记录到现在）并加入转发队列
+    
+    历史消息不参与积压丢弃，保证补发完整。
+    
+    Args:
+        client: Telegram 客户端实例
+        last_id: 上次处理的消息 ID
+        dispatcher: 消息转发调度器
     """
     logger.info(f"开始获取历史消息（从 ID {last_id} 之后）...")
     
@@ -286,25 +928,20 @@ async def fetch_history_messages(client: TelegramClient, last_id: int) -> int:
         
         if not new_messages:
             logger.info("没有新的历史消息")
-            return last_id
+            return
         
         # 按时间顺序处理（从旧到新）
         new_messages.sort(key=lambda m: m.id)
         
-        logger.info(f"共获取到 {len(new_messages)} 条新消息，开始处理...")
+        logger.info(f"共获取到 {len(new_messages)} 条新消息，加入转发队列...")
         
-        latest_id = last_id
-        for i, msg in enumerate(new_messages, 1):
-            logger.info(f"[{i}/{len(new_messages)}] 处理历史消息 ID: {msg.id}")
-            await process_message(msg)
-            latest_id = msg.id
+        for msg in new_messages:
+            dispatcher.submit(msg, from_history=True)
         
-        logger.info(f"历史消息处理完成，最新 ID: {latest_id}")
-        return latest_id
+        logger.info(f"历史消息已入队，最新 ID: {new_messages[-1].id}")
         
     except Exception as e:
         logger.error(f"获取历史消息失败: {e}", exc_info=True)
-        return last_id
 
 
 # ==================== 信号处理 ====================
@@ -332,6 +969,9 @@ async def main():
     # 读取上次处理的消息 ID
     last_message_id = read_last_message_id()
     
+    dispatcher = MessageDispatcher(last_message_id)
+    background_tasks: list[asyncio.Task] = []
+    
     # 创建 Telegram 客户端
     logger.info("正在连接 Telegram...")
     client = TelegramClient(
@@ -349,15 +989,33 @@ async def main():
         me = await client.get_me()
         logger.info(f"当前登录用户 ID: {me.id}")
         
+        # 加载优先级规则所需的群组信息
+        await load_admin_ids(client)
+        await refresh_pinned_ids(client)
+        
+        # 启动转发调度
+        background_tasks.append(asyncio.create_task(dispatcher.run(), name='转发调度'))
+        background_tasks.append(asyncio.create_task(dispatcher.report_loop(), name='丢弃汇总'))
+        if Config.PRIORITY_PINNED_REPLIES:
+            background_tasks.append(asyncio.create_task(pinned_refresh_loop(client), name='置顶刷新'))
+        
         # 获取历史消息
         logger.info(f"开始检查群组 ID: {Config.TG_CHAT_ID}")
-        last_message_id = await fetch_history_messages(client, last_message_id)
+        await fetch_history_messages(client, last_message_id, dispatcher)
         
         # 注册新消息处理器
         @client.on(events.NewMessage(chats=Config.TG_CHAT_ID))
         async def handler(event):
             """实时消息处理器"""
-            await process_message(event.message)
+            dispatcher.submit(event.message)
+        
+        # 置顶变化时立即刷新，供"回复置顶消息"规则使用
+        if Config.PRIORITY_PINNED_REPLIES:
+            @client.on(events.ChatAction(chats=Config.TG_CHAT_ID))
+            async def pin_handler(event):
+                """置顶变化处理器"""
+                if event.new_pin or event.unpin:
+                    await refresh_pinned_ids(client)
         
         logger.info("开始实时监听新消息...")
         logger.info("按 Ctrl+C 退出")
@@ -365,6 +1023,11 @@ async def main():
         # 保持运行
         while running:
             await asyncio.sleep(1)
+            
+            # 后台任务意外退出时不再假装正常运行
+            for task in background_tasks:
+                if task.done():
+                    raise RuntimeError(f"后台任务 {task.get_name()} 意外退出: {task.exception()!r}")
         
         logger.info("程序正常退出")
         
@@ -374,6 +1037,8 @@ async def main():
         logger.error(f"运行过程中发生错误: {e}", exc_info=True)
         sys.exit(1)
     finally:
+        for task in background_tasks:
+            task.cancel()
         if client:
             await client.disconnect()
             logger.info("已断开 Telegram 连接")